@@ -0,0 +1,84 @@
+"""Analytics tab latency on a large offers table (SQL aggregates per dimension, cached per filter and data version).
+
+Run from the repository root:  python benchmarks/bench_analytics.py [offers]
+"""
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import main  # noqa: E402
+
+USERS = ('admin', 'user2', 'user3', 'user4')
+AREAS = ('Αθήνα', 'Θεσσαλονίκη', 'Πάτρα', 'Ηράκλειο', ' Λάρισα ')
+TAX_SOLUTIONS = ('Πάροχος', 'Ταμειακή', 'ERP')
+PACKAGES = ('Service Pack Fuel 25K', 'Service Pack Fuel 50K', 'Service Pack Retail')
+TODAY = date(2026, 10, 19)
+BUDGET_SECONDS = 1.0
+
+
+def seed(offers):
+    rng = random.Random(0)
+    rows = []
+    for i in range(1, offers + 1):
+        issue_date = (TODAY - timedelta(days=rng.randrange(3 * 365))).strftime('%d/%m/%Y')
+        offer = {
+            "protocol_number": f"PR{i}", "client_company": f"Εταιρία {i}", "client_vat_id": "123456789",
+            "client_address": "Οδός 1", "client_tk": "11111", "client_area": rng.choice(AREAS), "client_phone": "2100000000",
+            "installations": rng.randint(1, 5), "unit_price": rng.choice((90.0, 120.0, 150.0)), "offer_valid_until": issue_date,
+            "issue_date": issue_date, "include_tech_description": True, "include_tax_solutions": True,
+            "tax_solution_choice": rng.choice(TAX_SOLUTIONS), "e_invoicing_package": rng.choice(PACKAGES),
+            "custom_title": "", "custom_content": "Προσαρμοσμένο κείμενο εισαγωγής. " * 20,
+            "created_by_user": rng.choice(USERS), "status": rng.choice(tuple(main.OFFER_STATUSES)),
+        }
+        rows.append((
+            offer['protocol_number'], offer['client_company'], offer['client_vat_id'], offer['client_address'], offer['client_tk'],
+            offer['client_area'], offer['client_phone'], offer['installations'], offer['unit_price'], offer['offer_valid_until'],
+            offer['issue_date'], True, True, offer['tax_solution_choice'], offer['e_invoicing_package'], offer['custom_title'],
+            offer['custom_content'], json.dumps(offer, ensure_ascii=False), offer['created_by_user'], offer['status'],
+        ))
+    conn = sqlite3.connect(main.DB_FILE)
+    conn.executemany("INSERT INTO offers VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)", rows)
+    conn.execute("INSERT INTO data_versions (name, version) VALUES ('offers', 1) ON CONFLICT(name) DO UPDATE SET version = version + 1")
+    conn.commit()
+    conn.close()
+    main.get_data_versions.clear()
+
+
+def timed(created_by_user, start_date, end_date):
+    started = time.perf_counter()
+    main.compute_offer_analytics(created_by_user, start_date, end_date)
+    return time.perf_counter() - started
+
+
+def run(offers):
+    main.init_db()
+    seed(offers)
+    print(f"{offers} offers, {os.path.getsize(main.DB_FILE) / 2**20:.0f} MB database")
+    print(f"{'filter':>22} {'cold (ms)':>10} {'cached (ms)':>12}")
+    cases = {
+        'all time': (None, None, None),
+        'last year': (None, TODAY - timedelta(days=365), TODAY),
+        'one user, 30 days': ('user2', TODAY - timedelta(days=30), TODAY),
+    }
+    slowest = 0.0
+    for name, args in cases.items():
+        cold, cached = timed(*args), timed(*args)
+        slowest = max(slowest, cold)
+        print(f"{name:>22} {cold * 1000:>10.1f} {cached * 1000:>12.2f}")
+    print(f"slowest cold run {'within' if slowest < BUDGET_SECONDS else 'OVER'} the {BUDGET_SECONDS:.0f} s budget")
+    return slowest < BUDGET_SECONDS
+
+
+if __name__ == '__main__':
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        try: within_budget = run(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
+        finally: os.chdir(cwd)
+    sys.exit(0 if within_budget else 1)
@@ -0,0 +1,49 @@
+"""Storage growth of the offer revision history (field-level deltas + periodic snapshots vs. full copies).
+
+Run from the repository root:  python benchmarks/bench_revision_storage.py [revisions]
+"""
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import main  # noqa: E402
+
+CHECKPOINTS = (10, 100, 500, 1000, 5000)
+
+
+def run(revisions):
+    main.init_db()
+    offer = {
+        "protocol_number": "PR1", "client_company": "Εταιρία", "client_vat_id": "123456789", "client_address": "Οδός 1",
+        "client_tk": "11111", "client_area": "Αθήνα", "client_phone": "2100000000", "custom_title": "",
+        "custom_content": "Προσαρμοσμένο κείμενο εισαγωγής. " * 30, "installations": 1, "unit_price": 120.0,
+        "offer_valid_until": "30/11/2026", "include_tech_description": True, "include_tax_solutions": True,
+        "tax_solution_choice": "Πάροχος", "e_invoicing_package": "Service Pack Fuel 25K", "issue_date": "19/10/2026",
+    }
+    conn = sqlite3.connect(main.DB_FILE)
+    full_copy_bytes = 0
+    print(f"{'revisions':>10} {'stored (KB)':>12} {'full copies (KB)':>17} {'ratio':>6} {'rebuild latest (ms)':>20}")
+    for revision in range(1, revisions + 1):
+        # A typical revision touches one or two fields.
+        offer = dict(offer, unit_price=100.0 + revision)
+        if revision % 7 == 0: offer['installations'] = revision % 5 + 1
+        main.save_offer_to_db(dict(offer), 'admin')
+        full_copy_bytes += len(json.dumps(dict(offer, created_by_user='admin'), ensure_ascii=False))
+        if revision in CHECKPOINTS or revision == revisions:
+            stored = conn.execute("SELECT SUM(LENGTH(revision_data)) FROM offer_revisions").fetchone()[0]
+            main._load_offer_revision_cached.clear()
+            start = time.perf_counter(); main.load_offer_revision('PR1', revision); rebuild = time.perf_counter() - start
+            print(f"{revision:>10} {stored / 1024:>12.1f} {full_copy_bytes / 1024:>17.1f} {stored / full_copy_bytes:>6.2f} {rebuild * 1000:>20.2f}")
+    conn.close()
+
+
+if __name__ == "__main__":
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        try: run(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
+        finally: os.chdir(cwd)
@@ -0,0 +1,37 @@
+import shutil
+import sys
+from pathlib import Path
+
+import pytest
+import streamlit as st
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+import main  # noqa: E402
+
+
+@pytest.fixture
+def app_dir(tmp_path, monkeypatch):
+    """Runs the test in an empty directory holding fresh databases and the PDF fonts."""
+    for font in ('DejaVuSans.ttf', 'DejaVuSans-Bold.ttf'):
+        shutil.copy(REPO_ROOT / font, tmp_path)
+    monkeypatch.chdir(tmp_path)
+    st.cache_data.clear()
+    main.init_db()
+    return tmp_path
+
+
+@pytest.fixture
+def make_offer():
+    def _make_offer(i, **overrides):
+        offer = {
+            "protocol_number": f"PR{i}", "client_company": f"Εταιρία {i}", "client_vat_id": "123456789",
+            "client_address": "Οδός 1", "client_tk": "11111", "client_area": "Αθήνα", "client_phone": "2100000000",
+            "custom_title": "", "custom_content": "", "installations": 1, "unit_price": 120.0,
+            "offer_valid_until": "30/11/2026", "include_tech_description": True, "include_tax_solutions": True,
+            "tax_solution_choice": "Πάροχος", "e_invoicing_package": "Service Pack Fuel 25K", "issue_date": "19/10/2026",
+        }
+        offer.update(overrides)
+        return offer
+    return _make_offer
@@ -0,0 +1,26 @@
+from datetime import date
+
+import main
+
+
+def test_analytics_breakdowns(app_dir, make_offer):
+    main.save_offer_to_db(make_offer(1, client_area=" Αθήνα ", installations=2, unit_price=100.0, status="accepted"), "admin")
+    main.save_offer_to_db(make_offer(2, client_area="Αθήνα", installations=1, unit_price=50.0), "admin")
+    main.save_offer_to_db(make_offer(3, client_area="", issue_date="05/09/2026", status="rejected"), "user2")
+    analytics = main.compute_offer_analytics()
+    by_area = analytics['client_area']
+    assert list(by_area.index) == ["Αθήνα"]
+    assert by_area.loc["Αθήνα", ['offers', 'total_value', 'accepted']].tolist() == [2, 250.0, 1]
+    assert by_area.loc["Αθήνα", 'conversion_rate'] == 0.5
+    assert list(analytics['month'].index) == ["2026-09", "2026-10"]
+    assert analytics['created_by_user']['offers'].to_dict() == {"admin": 2, "user2": 1}
+
+
+def test_analytics_filters_and_invalidation(app_dir, make_offer):
+    main.save_offer_to_db(make_offer(1), "admin")
+    main.save_offer_to_db(make_offer(2, issue_date="05/09/2026"), "user2")
+    october = (None, date(2026, 10, 1), date(2026, 10, 31))
+    assert main.compute_offer_analytics(*october)['created_by_user']['offers'].to_dict() == {"admin": 1}
+    assert main.compute_offer_analytics("user2")['created_by_user']['offers'].to_dict() == {"user2": 1}
+    main.save_offer_to_db(make_offer(3), "user2")
+    assert main.compute_offer_analytics(*october)['created_by_user']['offers'].to_dict() == {"admin": 1, "user2": 1}
@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+import main
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+OFFERS = 5
+
+
+def _counters(at):
+    return {m.label: int(m.value) for m in at.metric if m.label in ("Συνδέσεις DB", "Δημιουργίες PDF")}
+
+
+def _logged_in_admin():
+    at = AppTest.from_file(str(REPO_ROOT / "main.py"), default_timeout=60)
+    at.session_state['logged_in'] = True
+    at.session_state['username'] = 'admin'; at.session_state['user_role'] = 'admin'
+    at.session_state['first_name'] = 'Admin'; at.session_state['last_name'] = 'User'; at.session_state['email'] = 'admin@example.com'
+    return at
+
+
+def _metric(at, label):
+    return next(m.value for m in at.metric if m.label == label)
+
+
+def test_interactions_outside_history_do_not_rerender_pdfs(app_dir, make_offer):
+    today = datetime.now().strftime('%d/%m/%Y')
+    for i in range(OFFERS):
+        main.save_offer_to_db(make_offer(i, issue_date=today), 'admin')
+    at = _logged_in_admin()
+    at.run()
+    assert not at.exception
+    first = _counters(at)
+
+    # Changing the analytics date range and a plain rerun reuse every cached PDF and query.
+    date_input = at.date_input[0]
+    date_input.set_value(date_input.value - timedelta(days=5)).run()
+    assert not at.exception
+    after_interaction = _counters(at)
+    at.run()
+    after_rerun = _counters(at)
+
+    assert after_interaction["Δημιουργίες PDF"] == first["Δημιουργίες PDF"]
+    assert after_rerun["Δημιουργίες PDF"] == first["Δημιουργίες PDF"]
+    # Only the per-run init_db / init_shared_cache connections remain (plus a data-version poll at most).
+    assert after_rerun["Συνδέσεις DB"] - after_interaction["Συνδέσεις DB"] <= 3
+
+    # History renders a PDF only for the offer it is requested for.
+    at.toggle(key="pdf_toggle_PR0").set_value(True).run()
+    assert not at.exception
+    assert _counters(at)["Δημιουργίες PDF"] == first["Δημιουργίες PDF"] + 1
+
+
+def test_new_offer_updates_analytics(app_dir, make_offer, monkeypatch):
+    # AppTest reruns the whole script on every interaction, so the requested rerun scope is recorded as well:
+    # in a real session a fragment-scoped rerun would leave the Analytics tab stale.
+    rerun_scopes, rerun = [], st.rerun
+    def recording_rerun(*, scope="app"):
+        rerun_scopes.append(scope)
+        rerun(scope=scope)
+    monkeypatch.setattr(st, "rerun", recording_rerun)
+    main.save_offer_to_db(make_offer(0, issue_date=datetime.now().strftime('%d/%m/%Y')), 'admin')
+    at = _logged_in_admin()
+    at.run()
+    assert _metric(at, "Σύνολο Προσφορών") == "1"
+
+    fields = {"Επωνυμία*": "Νέα Εταιρία", "Οδός & Αριθμός*": "Οδός 2", "Τ.Κ.*": "22222", "Περιοχή*": "Πάτρα"}
+    for text_input in at.text_input:
+        if text_input.label in fields: text_input.input(fields[text_input.label])
+    next(b for b in at.button if b.label == "💾 Δημιουργία & Αποθήκευση").click().run()
+    assert not at.exception
+    assert any(s.value == "Η προσφορά δημιουργήθηκε και αποθηκεύτηκε!" for s in at.success)
+    assert _metric(at, "Σύνολο Προσφορών") == "2"
+    assert rerun_scopes == ["app"]
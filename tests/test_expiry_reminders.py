@@ -0,0 +1,80 @@
+import logging
+import smtplib
+import threading
+from datetime import date
+
+import pytest
+
+import main
+
+TODAY = date(2026, 11, 25)
+
+
+class FakeSMTP:
+    def __init__(self, fail=False):
+        self.fail, self.sent = fail, []
+
+    def send_message(self, msg):
+        if self.fail: raise OSError("connection refused")
+        self.sent.append(msg)
+
+
+@pytest.fixture
+def reminder_setup(app_dir, make_offer, monkeypatch):
+    monkeypatch.setattr(main.st, "secrets", {"SENDER_EMAIL": "offers@example.com"})
+    main.add_user_to_db("user2", "secret", "Μαρία", "Παπαδοπούλου", "user2@example.com")
+    main.save_offer_to_db(make_offer(1), "user2")
+
+
+def _reminded_at(protocol_number):
+    offer, = main.find_expiring_offers(today=TODAY, include_reminded=True)
+    assert offer['protocol_number'] == protocol_number
+    return offer['reminded_at']
+
+
+def test_reminder_is_sent_once(reminder_setup):
+    smtp = FakeSMTP()
+    assert main.process_expiry_reminders(today=TODAY, smtp=smtp) == (1, 0)
+    assert main.process_expiry_reminders(today=TODAY, smtp=smtp) == (0, 0)
+    assert [msg['To'] for msg in smtp.sent] == ["user2@example.com"]
+    assert _reminded_at('PR1')
+
+
+def test_failed_send_is_reported_and_released(reminder_setup, caplog):
+    with caplog.at_level(logging.ERROR):
+        assert main.process_expiry_reminders(today=TODAY, smtp=FakeSMTP(fail=True)) == (0, 1)
+    assert "user2@example.com" in caplog.text
+    assert _reminded_at('PR1') is None
+    assert main.process_expiry_reminders(today=TODAY, smtp=FakeSMTP()) == (1, 0)
+
+
+def test_dropped_connection_on_quit_keeps_the_result(reminder_setup, monkeypatch):
+    class DroppedSMTP(FakeSMTP):
+        def quit(self):
+            raise smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+
+    smtp = DroppedSMTP()
+    monkeypatch.setattr(main, "open_smtp_session", lambda: smtp)
+    assert main.process_expiry_reminders(today=TODAY) == (1, 0)
+    assert len(smtp.sent) == 1
+
+
+@pytest.mark.parametrize("status", ["accepted", "rejected"])
+def test_closed_offers_are_not_reminded(reminder_setup, make_offer, status):
+    main.save_offer_to_db(make_offer(1, status=status), "user2")
+    assert main.find_expiring_offers(today=TODAY, include_reminded=True) == []
+    assert main.process_expiry_reminders(today=TODAY, smtp=FakeSMTP()) == (0, 0)
+    main.save_offer_to_db(make_offer(1, status="open"), "user2")
+    assert main.process_expiry_reminders(today=TODAY, smtp=FakeSMTP()) == (1, 0)
+
+
+def test_scheduler_logs_failed_runs(caplog):
+    stop_event = threading.Event()
+
+    def failing_clock():
+        stop_event.set()
+        raise RuntimeError("clock failure")
+
+    with caplog.at_level(logging.ERROR):
+        main.run_expiry_scheduler(stop_event, interval=0, clock=failing_clock)
+    assert "clock failure" in caplog.text
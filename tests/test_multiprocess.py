@@ -0,0 +1,128 @@
+"""Runs several app processes against one working directory, as separate Streamlit server processes would."""
+import multiprocessing
+import os
+import sqlite3
+import time
+
+import streamlit as st
+from streamlit.runtime.caching import cache_utils
+
+import main
+
+CTX = multiprocessing.get_context('spawn')
+PROCESS_TIMEOUT = 60
+
+
+def _run(target, *args):
+    process = CTX.Process(target=target, args=args)
+    process.start()
+    return process
+
+
+def _join(*processes):
+    for process in processes:
+        process.join(PROCESS_TIMEOUT)
+        assert process.exitcode == 0
+
+
+def _load_then_wait_for_save(app_dir, offer_count, loaded, saved, results):
+    """Process B: warms its version-keyed caches, then polls until a save from another process shows up."""
+    os.chdir(app_dir)
+    counters = main.get_perf_counters()
+    assert len(main.load_offers_from_db()) == offer_count
+    connections = counters['db_connections']
+    main.load_offers_from_db()
+    results.put(('cached_reload_connections', counters['db_connections'] - connections))
+    loaded.set()
+    saved.wait(PROCESS_TIMEOUT)
+    deadline = time.monotonic() + PROCESS_TIMEOUT
+    while len(main.load_offers_from_db()) == offer_count and time.monotonic() < deadline:
+        time.sleep(0.05)
+    results.put(('offer_count_after_save', len(main.load_offers_from_db())))
+    results.put(('revision_counts', main.load_revision_counts()))
+
+
+def _save_offer(app_dir, offer, username, loaded, saved):
+    """Process A: saves one offer once process B holds cached data."""
+    os.chdir(app_dir)
+    loaded.wait(PROCESS_TIMEOUT)
+    main.save_offer_to_db(offer, username)
+    saved.set()
+
+
+def _render_pdf(app_dir, offer, results):
+    os.chdir(app_dir)
+    pdf = main.get_offer_pdf(offer)
+    results.put((main.get_perf_counters()['pdf_renders'], pdf))
+
+
+def _save_revisions(app_dir, offer, worker, count, barrier, results):
+    os.chdir(app_dir)
+    barrier.wait(PROCESS_TIMEOUT)
+    errors = []
+    for i in range(count):
+        try: main.save_offer_to_db(dict(offer, unit_price=f"{worker}-{i}"), 'admin', revised_by=f"worker{worker}")
+        except sqlite3.Error as e: errors.append(repr(e))
+    results.put(errors)
+
+
+def _drain(results, count):
+    return [results.get(timeout=PROCESS_TIMEOUT) for _ in range(count)]
+
+
+def test_save_in_one_process_invalidates_another(app_dir, make_offer):
+    for i in range(1, 4):
+        main.save_offer_to_db(make_offer(i), 'admin')
+    loaded, saved, results = CTX.Event(), CTX.Event(), CTX.Queue()
+    reader = _run(_load_then_wait_for_save, str(app_dir), 3, loaded, saved, results)
+    writer = _run(_save_offer, str(app_dir), make_offer(4), 'user2', loaded, saved)
+    outcome = dict(_drain(results, 3))
+    _join(reader, writer)
+    assert outcome['cached_reload_connections'] == 0
+    assert outcome['offer_count_after_save'] == 4
+    assert outcome['revision_counts'] == {'PR1': 1, 'PR2': 1, 'PR3': 1, 'PR4': 1}
+
+
+def test_data_versions_are_polled_every_interval(app_dir, monkeypatch):
+    # Drives the cache's TTL clock directly instead of timing a poll across processes.
+    now = [1000.0]
+    monkeypatch.setattr(cache_utils, "TTLCACHE_TIMER", lambda: now[0])
+    st.cache_data.clear()
+    before = main.get_data_version('offers')
+    # A save in another process bumps the version without clearing this process's cache.
+    conn = sqlite3.connect(main.DB_FILE)
+    main._bump_data_version(conn.cursor(), 'offers')
+    conn.commit(); conn.close()
+    now[0] += main.DATA_VERSION_POLL_SECONDS - 0.01
+    assert main.get_data_version('offers') == before
+    now[0] += 0.02
+    assert main.get_data_version('offers') == before + 1
+
+
+def test_pdf_rendered_in_one_process_is_reused_by_another(app_dir, make_offer):
+    results = CTX.Queue()
+    renders = []
+    for _ in range(2):
+        process = _run(_render_pdf, str(app_dir), make_offer(1), results)
+        renders.append(results.get(timeout=PROCESS_TIMEOUT))
+        _join(process)
+    (first_renders, first_pdf), (second_renders, second_pdf) = renders
+    assert (first_renders, second_renders) == (1, 0)
+    assert first_pdf and second_pdf == first_pdf
+
+
+def test_concurrent_saves_get_consecutive_revisions(app_dir, make_offer):
+    main.save_offer_to_db(make_offer(1), 'admin')
+    workers, saves_per_worker = 4, 5
+    barrier, results = CTX.Barrier(workers), CTX.Queue()
+    processes = [_run(_save_revisions, str(app_dir), make_offer(1), worker, saves_per_worker, barrier, results)
+                 for worker in range(workers)]
+    errors = [error for worker_errors in _drain(results, workers) for error in worker_errors]
+    _join(*processes)
+    assert errors == []
+    revisions = sorted(row[0] for row in main.list_offer_revisions('PR1'))
+    assert revisions == list(range(1, workers * saves_per_worker + 2))
+    # The head matches the last revision written.
+    head = main.load_offers_from_db()[0]
+    last = main.load_offer_revision('PR1', revisions[-1])
+    assert head['unit_price'] == last['unit_price']
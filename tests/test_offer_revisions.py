@@ -0,0 +1,92 @@
+import json
+import sqlite3
+
+import main
+
+
+def _save_revisions(make_offer, count):
+    """Saves `count` revisions of PR1, each with a different unit price; returns the expected state of every revision."""
+    states = []
+    for revision in range(1, count + 1):
+        offer = make_offer(1, unit_price=100.0 + revision, installations=1 + revision // 7)
+        main.save_offer_to_db(dict(offer), 'admin')
+        states.append(dict(offer, created_by_user='admin'))
+    return states
+
+
+def test_revisions_rebuild_exactly_across_snapshot_boundaries(app_dir, make_offer):
+    states = _save_revisions(make_offer, 25)
+    for revision in (1, 10, 11, 12, 21, 25):
+        assert main.load_offer_revision('PR1', revision) == states[revision - 1]
+    conn = sqlite3.connect(main.DB_FILE)
+    snapshots = [row[0] for row in conn.execute("SELECT revision FROM offer_revisions WHERE is_snapshot ORDER BY revision")]
+    conn.close()
+    assert snapshots == [1, 11, 21]
+
+
+def test_unchanged_save_adds_no_revision(app_dir, make_offer):
+    main.save_offer_to_db(make_offer(1), 'admin')
+    main.save_offer_to_db(make_offer(1), 'admin')
+    assert main.load_revision_counts() == {'PR1': 1}
+
+
+def test_offer_saved_before_revisions_is_backfilled_as_revision_1(app_dir, make_offer):
+    legacy = make_offer(1, created_by_user='admin')
+    conn = sqlite3.connect(main.DB_FILE)
+    conn.execute("INSERT INTO offers (protocol_number, full_offer_data, created_by_user) VALUES (?, ?, ?)",
+                 ('PR1', json.dumps(legacy, ensure_ascii=False), 'admin'))
+    conn.commit(); conn.close()
+    main.save_offer_to_db(make_offer(1, unit_price=99.0), 'admin')
+    assert main.load_offer_revision('PR1', 1) == legacy
+    assert main.load_offer_revision('PR1', 2)['unit_price'] == 99.0
+
+
+def test_delta_storage_grows_much_slower_than_full_copies(app_dir, make_offer):
+    states = _save_revisions(make_offer, 200)
+    conn = sqlite3.connect(main.DB_FILE)
+    stored = conn.execute("SELECT SUM(LENGTH(revision_data)) FROM offer_revisions").fetchone()[0]
+    conn.close()
+    full_copies = sum(len(json.dumps(state, ensure_ascii=False)) for state in states)
+    assert stored < 0.3 * full_copies
+
+
+def test_unchanged_pdf_content_is_rendered_once(app_dir, make_offer):
+    main.save_offer_to_db(make_offer(1), 'admin')
+    main.save_offer_to_db(make_offer(1, status='accepted'), 'admin')
+    renders = main.get_perf_counters()['pdf_renders']
+    head = main.load_offers_from_db()[0]
+    assert main.get_offer_pdf(head)
+    assert main.get_perf_counters()['pdf_renders'] == renders + 1
+    # The status-only revision and the revision before it print the same PDF as the head.
+    assert main.render_offer_revision('PR1', 2) == main.render_offer_revision('PR1', 1) == main.get_offer_pdf(head)
+    assert main.get_perf_counters()['pdf_renders'] == renders + 1
+
+
+def test_missing_revision_is_none_until_saved(app_dir, make_offer):
+    main.save_offer_to_db(make_offer(1), 'admin')
+    assert main.load_offer_revision('PR1', 2) is None
+    main.save_offer_to_db(make_offer(1, unit_price=99.0), 'admin')
+    assert main.load_offer_revision('PR1', 2)['unit_price'] == 99.0
+
+
+def test_revision_lists_come_from_one_cached_query(app_dir, make_offer):
+    for i in (1, 2):
+        main.save_offer_to_db(make_offer(i), 'admin')
+        main.save_offer_to_db(make_offer(i, unit_price=99.0), 'user2')
+    assert [row[:2] for row in main.list_offer_revisions('PR1')] == [(2, 'user2'), (1, 'admin')]
+    counters = main.get_perf_counters()
+    connections = counters['db_connections']
+    assert [row[0] for row in main.list_offer_revisions('PR2')] == [2, 1]
+    assert main.list_offer_revisions('PR3') == []
+    assert counters['db_connections'] == connections
+
+
+def test_status_change_keeps_edits_saved_since_the_page_was_drawn(app_dir, make_offer):
+    main.save_offer_to_db(make_offer(1, unit_price=100.0), 'admin')
+    main.save_offer_to_db(make_offer(1, unit_price=250.0), 'admin', revised_by='user2')
+    assert main.set_offer_status('PR1', 'accepted', 'admin')
+    head = main.load_offers_from_db()[0]
+    assert (head['unit_price'], head['status']) == (250.0, 'accepted')
+    assert main.load_revision_counts() == {'PR1': 3}
+    assert main.load_offer_revision('PR1', 3) == dict(make_offer(1, unit_price=250.0), created_by_user='admin', status='accepted')
+    assert not main.set_offer_status('PR2', 'accepted', 'admin')